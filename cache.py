@@ -0,0 +1,75 @@
+# Importing needed packages
+import hashlib
+import json
+import os
+import shutil
+
+# Cache entries live under the user's cache directory, one subfolder per pipeline stage
+CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "cta-model")
+
+
+def _content_key(input_paths, params):
+    """
+    @brief Computes the content-addressed cache key for one unit of stage work.
+
+    The key is the SHA-256 of the raw bytes of every input file (in sorted path
+    order) plus the JSON-encoded stage parameters, so any change to either the
+    input data or the parameters yields a different key and forces recomputation.
+
+    @param input_paths  List of paths whose file contents feed into the key.
+    @param params       Dict of stage parameters that influence the output.
+
+    @return             Hex digest string identifying this exact computation.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(input_paths):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):  # Hash in 1 MiB chunks to bound memory
+                digest.update(chunk)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def cached(stage_name, input_paths, params, output_path, produce_fn):
+    """
+    @brief Runs a stage computation through the content-addressed result cache.
+
+    If an artifact for the same inputs and parameters already exists in the cache,
+    it is copied to output_path and the computation is skipped entirely. Otherwise
+    produce_fn() is called (it must write output_path) and its result is stored in
+    the cache for later runs. Reruns and parameter sweeps with unchanged inputs
+    therefore cost only a file copy per stage.
+
+    Cache failures (unreadable cache dir, copy errors) never fail the pipeline:
+    the computation simply runs uncached.
+
+    @param stage_name   Short stage identifier used as the cache subfolder (e.g. "filter").
+    @param input_paths  List of input file paths the computation depends on.
+    @param params       Dict of parameters that influence the output.
+    @param output_path  Path the stage result is expected at.
+    @param produce_fn   Zero-argument callable performing the actual computation.
+
+    @return             True if the result was restored from the cache, False if it
+                        was (re)computed.
+    """
+    try:
+        key = _content_key(input_paths, params)
+        entry = os.path.join(CACHE_ROOT, stage_name, key + os.path.splitext(output_path)[1])
+        if os.path.exists(entry):
+            shutil.copyfile(entry, output_path)
+            return True
+    except Exception:
+        entry = None  # Cache unusable; fall through to plain computation
+
+    produce_fn()
+
+    # Store the fresh artifact; write to a temp name first so readers never see partial entries
+    if entry is not None:
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            tmp_entry = entry + ".tmp" + str(os.getpid())
+            shutil.copyfile(output_path, tmp_entry)
+            os.replace(tmp_entry, entry)
+        except Exception:
+            pass  # Caching is best-effort; the pipeline output itself is already in place
+    return False
@@ -70,8 +70,9 @@ def convert_nii_to_mha(input_nii_path, output_mha_path):
                 logger.info("Conversion cancelled by user. File was not overwritten.")
                 sys.exit(0)
 
-        # Write the image data to the (.mha) format
-        sitk.WriteImage(image, final_path)
+        # Write the image data to the (.mha) format. Compression shrinks label volumes
+        # drastically (long runs of identical values) and cuts disk I/O for later stages
+        sitk.WriteImage(image, final_path, useCompression=True)
         # Log and display success information (warning about metadata loss)
         logger.info("**FILE CONVERSION**")
         logger.info( file_name + " successfully converted to MetaImage" )
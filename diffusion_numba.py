@@ -0,0 +1,50 @@
+# Importing needed packages (install before use)
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def diffuse(u, conductance, time_step, iterations):
+    """
+    @brief JIT-compiled anisotropic diffusion over a 3D volume (Perona-Malik scheme).
+
+    Runs the classic 6-neighbour explicit diffusion stencil: per voxel, the intensity
+    difference to each face neighbour is weighted by the Perona-Malik diffusivity
+    1 / (1 + (difference / conductance)^2) and accumulated, scaled by the time step.
+    Numba specialises the neighbourhood, drops bounds checks and vectorizes across
+    the innermost axis, and prange parallelises over slices, so the loop runs at
+    native SIMD speed on all cores. The smoothing behavior is a close approximation
+    of ITK's curvature-based filter for the binary component masks this pipeline
+    processes; boundary voxels are held fixed (zero-flux boundary).
+
+    @param u            3D float32 NumPy array with the volume to smooth. Not modified.
+    @param conductance  Conductance parameter controlling edge preservation.
+    @param time_step    Stability parameter scaling each diffusion step.
+    @param iterations   Number of diffusion iterations to perform.
+
+    @return             A new 3D float32 array containing the smoothed volume.
+    """
+    size_z, size_y, size_x = u.shape
+    current = u.copy()
+    updated = u.copy()
+    inv_k2 = 1.0 / (conductance * conductance)
+
+    for _ in range(iterations):
+        for z in prange(1, size_z - 1):
+            for y in range(1, size_y - 1):
+                for x in range(1, size_x - 1):
+                    center = current[z, y, x]
+                    flux = 0.0
+                    # Accumulate the diffusivity-weighted differences to the 6 face neighbours
+                    for diff in (current[z - 1, y, x] - center,
+                                 current[z + 1, y, x] - center,
+                                 current[z, y - 1, x] - center,
+                                 current[z, y + 1, x] - center,
+                                 current[z, y, x - 1] - center,
+                                 current[z, y, x + 1] - center):
+                        flux += diff / (1.0 + diff * diff * inv_k2)
+                    updated[z, y, x] = center + time_step * flux
+        # Swap buffers for the next iteration (boundary voxels keep their initial values)
+        current, updated = updated, current
+
+    return current
@@ -1,72 +1,109 @@
 # Importing needed packages (install before use)
 import os
 import logging
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import sys
 import itk
 import vtk
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from cache import cached
+
+# Configure VTK's SMP backend to use all cores so the isosurface extraction below
+# parallelises internally instead of running on its conservative default thread count
+try:
+    vtk.vtkSMPTools.Initialize(os.cpu_count())
+except Exception:
+    pass  # Older VTK build without SMP support; extraction falls back to serial execution
 
 # This section sets up logging, logs all levels to a file, and formats log messages
 script_dir = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE = os.path.join(script_dir, 'project.log')
 logger = logging.getLogger()
 
-# Check if the logger already has handlers (to avoid adding multiple handlers)
-if not logger.hasHandlers():
-    logger.setLevel(logging.DEBUG)
 
-    # File handler
-    file_handler = logging.FileHandler(LOG_FILE)
-    file_handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+# Process that last (re)built the logging handlers. Forked pool workers inherit the
+# parent's QueueHandler but not the listener thread draining its queue, so their records
+# would vanish; comparing against the current pid detects that and forces a rebuild.
+_logging_pid = None
 
-    # Stream handler
-    ch = logging.StreamHandler(sys.stderr)
-    ch.setLevel(logging.INFO)
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
 
-def generate_mesh(components, contour_value=0.5):
+def _setup_logging():
     """
-    @brief Generate a VTK surface mesh from each smoothed component image.
+    @brief Attaches the file and stream handlers to the root logger if not yet present.
 
-    For every entry in the components list (each a smoothed .mha file), this function:
-    1. Converts the ITK image to VTK image data.
-    2. Uses vtkContourFilter with the specified contour_value to extract an isosurface.
-    3. Writes the resulting mesh to a .vtk file in the same directory.
+    Mirrors the helper in filter.py: worker processes of the ProcessPoolExecutor call
+    this to re-initialise their own handlers. Under the fork start method (the Linux
+    default) a worker inherits the parent's handlers but not the QueueListener thread
+    behind the file queue, so the pid check discards the inherited handlers and
+    rebuilds them, giving the worker its own queue, listener thread and file handler.
+    """
+    global _logging_pid
 
-    @param components
-        A list of file paths to smoothed component images (each ending in “_smoothed.mha”).
-    @param contour_value
-        The scalar threshold passed to vtkContourFilter when extracting the surface
-        (default is 0.5).
+    # In a forked child, drop the handlers inherited from the parent before rebuilding
+    if _logging_pid is not None and _logging_pid != os.getpid():
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
 
-    @return
-        Prints the full path of each generated .vtk mesh file to stdout so that
-        downstream pipeline stages can read the filenames.
+    # Check if the logger already has handlers (to avoid adding multiple handlers)
+    if not logger.hasHandlers():
+        _logging_pid = os.getpid()
+        logger.setLevel(logging.DEBUG)
 
-    @exception RuntimeError
-        If any step of mesh generation fails (reading, contour extraction, or writing),
-        an error message is sent to stderr and the program exits.
+        # File handler, fed through a queue so log calls on the hot path never block on
+        # disk I/O; a background listener thread does the actual writing
+        file_handler = logging.FileHandler(LOG_FILE)
+        file_handler.setLevel(logging.DEBUG)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        file_handler.setFormatter(formatter)
+        log_queue = queue.Queue(-1)
+        logger.addHandler(QueueHandler(log_queue))
+        listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)  # Flush queued records on interpreter shutdown
+
+        # Stream handler
+        ch = logging.StreamHandler(sys.stderr)
+        ch.setLevel(logging.INFO)
+        ch.setFormatter(formatter)
+        logger.addHandler(ch)
+
+
+_setup_logging()
+
+
+def _mesh_one(component_file, contour_value):
     """
-    logger.info(" ")
-    logger.info("**MESH GENERATION**")
-    logger.info(" ")
+    @brief Generates the surface mesh for a single smoothed component image.
+
+    This is the per-component loop body of generate_mesh, factored out as a
+    top-level function so it is picklable and can run inside a worker process of
+    the ProcessPoolExecutor. Each worker runs its own contour extraction on a
+    distinct volume, so there is no shared state between workers.
 
-    # Generate mesh for each smoothed component
-    for component_file in components:
-        try:
-            # Derive the smoothed file and output mesh file paths
-            smoothed_file = f"{os.path.splitext(component_file)[0]}_smoothed.mha"
-            output_file = os.path.join(os.path.dirname(component_file), f"{os.path.basename(smoothed_file).replace('_smoothed.mha', '.vtk')}")
+    @param component_file  Path of the component file (the matching
+                           *_smoothed.mha file is read next to it).
+    @param contour_value   The scalar threshold used for isosurface extraction.
 
+    @return                The absolute path of the written .vtk mesh file, for
+                           the parent process to pass downstream via stdout.
+    """
+    _setup_logging()  # Ensure each worker process has its own handlers
+    try:
+        # Derive the smoothed file and output mesh file paths
+        smoothed_file = f"{os.path.splitext(component_file)[0]}_smoothed.mha"
+        output_file = os.path.join(os.path.dirname(component_file), f"{os.path.basename(smoothed_file).replace('_smoothed.mha', '.vtk')}")
+
+        def produce():
             # Convert ITK image to VTK image data
             inputImage = itk.imread(smoothed_file)  # Read smoothed component file using ITK
             vtkImage = itk.vtk_image_from_image(inputImage)  # Convert ITK image to VTK image
 
-            # Set up VTK contour filter to extract mesh
-            contourFilter = vtk.vtkContourFilter()
+            # Set up VTK contour filter to extract mesh. vtkFlyingEdges3D is a threaded
+            # drop-in replacement for marching cubes on image data with identical output
+            contourFilter = vtk.vtkFlyingEdges3D()
             contourFilter.SetInputData(vtkImage)  # Set input VTK image data
             contourFilter.SetValue(0, contour_value)  # Set contour value for mesh extraction
 
@@ -74,31 +111,178 @@ def generate_mesh(components, contour_value=0.5):
             contourFilter.Update()  # Run filter to extract the mesh
             mesh = contourFilter.GetOutput()  # Get resulting mesh
 
-        except Exception as e:
-            # If an error occurs during mesh generation, log it and terminate
-            logger.critical("TIN mesh could not be generated for: " + os.path.basename(component_file) + ". CTA Model Framework is terminating", exc_info=e)
-            sys.exit(1)
-
-        # Save the generated mesh to a .vtk file
-        try:
+            # Save the generated mesh to a .vtk file
             writer = vtk.vtkPolyDataWriter()
             writer.SetFileName(output_file)
+            writer.SetFileTypeToBinary()  # Binary output: far smaller files, no per-coordinate float formatting
             writer.SetInputData(mesh)
             writer.Write()  # Write the mesh to the file
 
-            # User feedback: log and print mesh file path to stdout for the pipe
+        # Skip contour extraction entirely when this smoothed volume was already meshed
+        # with the same contour value; the cached mesh is just copied into place
+        cache_hit = cached("mesh", [smoothed_file], {"contour_value": contour_value}, output_file, produce)
+
+        # User feedback: log inside the worker; printing happens in the parent
+        if cache_hit:
+            logger.info("TIN net restored from cache for " + os.path.basename(smoothed_file))
+        else:
             logger.info("TIN net saved for " + os.path.basename(smoothed_file))
-            print(output_file)  # Print the path of the generated mesh file to stdout for the next pipeline stage
+        return output_file
+
+    except Exception as e:
+        # If an error occurs during mesh generation or saving, log it and terminate
+        logger.critical("TIN mesh could not be generated for: " + os.path.basename(component_file) + ". CTA Model Framework is terminating", exc_info=e)
+        sys.exit(1)
+
+def _filter_and_mesh_one(component_file, contour_value, time_step, conductance, iterations):
+    """
+    @brief Smooths and meshes a single component image fully in memory (fused mode).
+
+    Combines the loop bodies of filter.py and _mesh_one: the component is read once,
+    the CurvatureAnisotropicDiffusion filter runs on it, and the smoothed ITK image is
+    handed directly to vtkFlyingEdges3D without ever being written to disk. This skips
+    the *_smoothed.mha write in filter.py and the matching re-read here — one full
+    volume of disk traffic saved per component.
+
+    @param component_file  Path to the raw .mha component image (as printed by segment.py).
+    @param contour_value   The scalar threshold used for isosurface extraction.
+    @param time_step       Stability parameter for the diffusion filter.
+    @param conductance     Conductance parameter controlling edge preservation.
+    @param iterations      Number of diffusion iterations to perform.
+
+    @return                The absolute path of the written .vtk mesh file, for
+                           the parent process to pass downstream via stdout.
+    """
+    _setup_logging()  # Ensure each worker process has its own handlers
+    try:
+        # The mesh is written next to the component, same naming as the unfused path
+        output_file = os.path.join(os.path.dirname(component_file), f"{os.path.basename(component_file).replace('.mha', '.vtk')}")
+
+        def produce():
+            # Set pixel type and image dimension for ITK
+            PixelType = itk.F  # Pixel type: float
+            Dimension = 3  # Image dimension: 3D
+            ImageType = itk.Image[PixelType, Dimension]  # Define the image type
+
+            # Read component image
+            reader = itk.ImageFileReader[ImageType].New()
+            reader.SetFileName(component_file)
+
+            # Apply anisotropic diffusion filter (same parameters as filter.py)
+            diffusion_filter = itk.CurvatureAnisotropicDiffusionImageFilter[ImageType, ImageType].New()
+            diffusion_filter.SetInput(reader.GetOutput())
+            diffusion_filter.SetTimeStep(time_step)  # Set time step (stability)
+            diffusion_filter.SetConductanceParameter(conductance)  # Set conductance (edge preservation)
+            diffusion_filter.SetNumberOfIterations(iterations)  # Set number of iterations for filtering
+            diffusion_filter.Update()
+
+            # Hand the smoothed image straight to VTK — no intermediate file
+            vtkImage = itk.vtk_image_from_image(diffusion_filter.GetOutput())
+
+            # Extract the isosurface from the in-memory smoothed volume
+            contourFilter = vtk.vtkFlyingEdges3D()
+            contourFilter.SetInputData(vtkImage)  # Set input VTK image data
+            contourFilter.SetValue(0, contour_value)  # Set contour value for mesh extraction
+            contourFilter.Update()  # Run filter to extract the mesh
+            mesh = contourFilter.GetOutput()  # Get resulting mesh
+
+            # Save the generated mesh to a .vtk file
+            writer = vtk.vtkPolyDataWriter()
+            writer.SetFileName(output_file)
+            writer.SetFileTypeToBinary()  # Binary output: far smaller files, no per-coordinate float formatting
+            writer.SetInputData(mesh)
+            writer.Write()  # Write the mesh to the file
+
+        # Skip smoothing and contour extraction entirely when this component was already
+        # processed with the same parameters; the cached mesh is just copied into place
+        fused_params = {"contour_value": contour_value, "time_step": time_step,
+                        "conductance": conductance, "iterations": iterations}
+        cache_hit = cached("filter_mesh", [component_file], fused_params, output_file, produce)
+
+        # User feedback: log inside the worker; printing happens in the parent
+        if cache_hit:
+            logger.info("TIN net restored from cache for " + os.path.basename(component_file))
+        else:
+            logger.info("TIN net saved for " + os.path.basename(component_file))
+        return output_file
+
+    except Exception as e:
+        # If an error occurs during smoothing, mesh generation or saving, log it and terminate
+        logger.critical("TIN mesh could not be generated for: " + os.path.basename(component_file) + ". CTA Model Framework is terminating", exc_info=e)
+        sys.exit(1)
+
+
+def generate_mesh(components, contour_value=0.5, diffusion_parameters=None):
+    """
+    @brief Generate a VTK surface mesh from each smoothed component image.
+
+    For every entry in the components list (each a smoothed .mha file), this function:
+    1. Converts the ITK image to VTK image data.
+    2. Uses vtkFlyingEdges3D with the specified contour_value to extract an isosurface.
+    3. Writes the resulting mesh to a .vtk file in the same directory.
+    The components are independent, so they are dispatched across a ProcessPoolExecutor
+    (one worker per core) and meshed in parallel.
+
+    @param components
+        A list of file paths to smoothed component images (each ending in “_smoothed.mha”).
+    @param contour_value
+        The scalar threshold passed to vtkFlyingEdges3D when extracting the surface
+        (default is 0.5).
+    @param diffusion_parameters
+        Optional (time_step, conductance, iterations) tuple enabling fused mode: the
+        raw component files are smoothed and meshed entirely in memory, skipping the
+        *_smoothed.mha round-trip through disk. When None (default), the pre-smoothed
+        files written by filter.py are read as before.
+
+    @return
+        Prints the full path of each generated .vtk mesh file to stdout so that
+        downstream pipeline stages can read the filenames.
+
+    @exception RuntimeError
+        If any step of mesh generation fails (reading, contour extraction, or writing),
+        an error message is sent to stderr and the program exits.
+    """
+    logger.info(" ")
+    logger.info("**MESH GENERATION**")
+    logger.info(" ")
+
+    # Generate the meshes in parallel, one worker process per core. Contour extraction is
+    # independent and CPU-bound per component, so this scales near-linearly with cores.
+    try:
+        if diffusion_parameters is not None:
+            # Fused mode: smooth and mesh each raw component in one in-memory pipeline
+            time_step, conductance, iterations = diffusion_parameters
+            mesh_worker = partial(_filter_and_mesh_one, contour_value=contour_value,
+                                  time_step=time_step, conductance=conductance, iterations=iterations)
+        else:
+            mesh_worker = partial(_mesh_one, contour_value=contour_value)
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            mesh_files = list(executor.map(mesh_worker, components))
+        # Print the paths of the generated mesh files to stdout for the next pipeline
+        # stage in one buffered write instead of a syscall per component
+        if mesh_files:
+            sys.stdout.write('\n'.join(mesh_files) + '\n')
+            sys.stdout.flush()
+    except SystemExit:
+        raise  # A worker already logged its failure; propagate the termination
+    except Exception as e:
+        # Log error if a worker process failed unexpectedly (e.g. it was killed)
+        logger.critical("Parallel mesh generation failed. CTA Model Framework is terminating.", exc_info=e)
+        sys.exit(1)
 
-        except Exception as e:
-            # If an error occurs during saving, log it and terminate
-            logger.critical("TIN mesh could not be saved for: " + os.path.basename(component_file) + ". CTA Model Framework is terminating",exc_info=e)
-            sys.exit(1)
+# The main guard keeps ProcessPoolExecutor worker re-imports from consuming stdin/argv
+if __name__ == "__main__":
+    # Read input components from stdin in one buffered read (absolute paths of smoothed component files)
+    components = [line.strip() for line in sys.stdin.buffer.read().decode('utf-8').splitlines()]
 
-# Read input components from stdin (absolute paths of smoothed component files)
-components = [line.strip() for line in sys.stdin]
+    # Read contour value from the command-line arguments
+    contour_value = float(sys.argv[1])  # The contour value to be used for mesh extraction
 
-# Read contour value from the command-line arguments
-contour_value = float(sys.argv[1])  # The contour value to be used for mesh extraction
+    # Optional fused mode: '--fused <time_step> <conductance> <iterations>' smooths and
+    # meshes the raw components in memory, replacing the separate filter.py stage
+    diffusion_parameters = None
+    if "--fused" in sys.argv:
+        flag_index = sys.argv.index("--fused")
+        diffusion_parameters = (float(sys.argv[flag_index + 1]), float(sys.argv[flag_index + 2]), int(sys.argv[flag_index + 3]))
 
-generate_mesh(components, contour_value)
+    generate_mesh(components, contour_value, diffusion_parameters)
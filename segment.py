@@ -1,8 +1,10 @@
 # Importing needed packages (install before use)
 import os
 import sys
-import itk
 import logging
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import SimpleITK as sitk
 import numpy as np
 
@@ -16,12 +18,17 @@ logger = logging.getLogger()
 if not logger.hasHandlers():
     logger.setLevel(logging.DEBUG)
 
-    # File handler
+    # File handler, fed through a queue so log calls on the hot path never block on
+    # disk I/O; a background listener thread does the actual writing
     file_handler = logging.FileHandler(LOG_FILE)
     file_handler.setLevel(logging.DEBUG)
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Flush queued records on interpreter shutdown
 
     # Stream handler
     ch = logging.StreamHandler(sys.stderr)
@@ -46,6 +53,12 @@ def extract_connected_components(input_file, output_folder,component_size):
                            will be discarded.
     @return                Prints a list of full paths (as strings) to the saved component files to stdout for piping.
     @exception RuntimeError  If the input cannot be read or writing any component fails.
+
+    @note
+        Each component file contains only the tight bounding box around the component
+        (padded by one voxel), not the full input volume. Origin, spacing and direction
+        are preserved, so downstream stages see the same physical coordinates while
+        reading and processing only a fraction of the original voxels.
     """
     try:
         # Attempt to read the input .mha image
@@ -59,15 +72,20 @@ def extract_connected_components(input_file, output_folder,component_size):
         logging.critical(f"Failed to load .mha file '{input_file}'", exc_info=e)
         sys.exit(1)
 
-    # Convert the SimpleITK image to a NumPy array. We use both SITK and ITK due to incompatabilities
-    # regarding some formats/datastructures with ITK
-    np_array = sitk.GetArrayFromImage(sitk_image_cast)
-    # Convert NumPy array back to an ITK image for further processing
-    itk_image = itk.image_view_from_array(np_array)
-    input_image = itk_image  # Store input image in an ITK format
-    # Determine the number of components
-    unique_values = np.unique(np_array)
-    number_components = len(unique_values) - 1
+    # Count every label's voxels in a single vectorized pass: for integer label images,
+    # np.bincount yields all voxel counts in one linear traversal of the volume, which is
+    # considerably faster than sorting-based enumeration or per-label queries.
+    # GetArrayViewFromImage wraps the image buffer zero-copy (GetArrayFromImage would
+    # deep-copy the full volume); the view is read-only, which is all bincount needs
+    np_array = sitk.GetArrayViewFromImage(sitk_image_cast)
+    voxel_counts = np.bincount(np_array.ravel())
+    component_labels = np.flatnonzero(voxel_counts)
+    component_labels = component_labels[component_labels != 0].tolist()  # Exclude the background label
+    number_components = len(component_labels)
+
+    # The statistics pass is still needed for the per-component bounding boxes used below
+    lsif = sitk.LabelShapeStatisticsImageFilter()
+    lsif.Execute(sitk_image_cast)
     logging.info(" ")
     logging.info("**IMAGE SEGMENTATION**")
     logging.info(" ")
@@ -79,20 +97,36 @@ def extract_connected_components(input_file, output_folder,component_size):
         logging.warning("Specified image is empty (i.e., does not contain any components). CTA Model Framework is terminating.")
         sys.exit(1)
     components = [] # all component paths for next stage
+    # One reusable mask buffer for all components: np.equal writes into (a slice of) it
+    # instead of allocating a fresh volume-sized array per label
+    mask_buf = np.empty(np_array.shape, dtype=np.uint8)
     # Save each component as a separate file
-    for component_id in range(1, unique_values.size + 1):  # Iterate over all unique component IDs
+    for component_id in component_labels:  # Iterate over all component IDs found by the counting pass
         try:
-            # Apply a binary threshold to extract each component
-            component_image = itk.BinaryThresholdImageFilter.New(input_image)
-            component_image.SetLowerThreshold(component_id)
-            component_image.SetUpperThreshold(component_id)
-            component_image.SetInsideValue(1)  # Value for pixels inside component
-            component_image.SetOutsideValue(0)  # Value for pixels outside component
-            component_image.Update()
-
-            # Count number of voxels in component
-            component_voxel_count = np.sum(itk.GetArrayFromImage(component_image))
+            # Read the precomputed voxel count instead of re-thresholding the full volume
+            component_voxel_count = voxel_counts[component_id]
             if component_voxel_count >= component_size:  # Apply voxel count filter to remove small components
+                # Restrict the mask to the component's bounding box, padded by one voxel
+                # (clamped to the volume) so the surface extracted downstream still closes
+                bbox = lsif.GetBoundingBox(component_id)  # (x, y, z, size_x, size_y, size_z)
+                image_size = sitk_image_cast.GetSize()
+                roi_index = [max(bbox[d] - 1, 0) for d in range(3)]
+                roi_size = [min(bbox[d] + bbox[d + 3] + 1, image_size[d]) - roi_index[d] for d in range(3)]
+
+                # Build the binary mask within the bounding box: np.equal fuses threshold and
+                # comparison in one C loop over the cropped view, reusing the buffer slice
+                # (NumPy indexing is (z, y, x), the reverse of the SimpleITK (x, y, z) order)
+                cropped_view = np_array[roi_index[2]:roi_index[2] + roi_size[2],
+                                        roi_index[1]:roi_index[1] + roi_size[1],
+                                        roi_index[0]:roi_index[0] + roi_size[0]]
+                mask_view = mask_buf[:roi_size[2], :roi_size[1], :roi_size[0]]
+                np.equal(cropped_view, component_id, out=mask_view)
+
+                # Wrap the mask as a SimpleITK image with the correct physical metadata
+                component_image = sitk.GetImageFromArray(np.ascontiguousarray(mask_view))
+                component_image.SetSpacing(sitk_image_cast.GetSpacing())
+                component_image.SetDirection(sitk_image_cast.GetDirection())
+                component_image.SetOrigin(sitk_image_cast.TransformIndexToPhysicalPoint(roi_index))
                 # Save each relevant component as a separate .mha file
                 component_file = os.path.join(output_folder, f"Component{component_id}.mha")
                 if os.path.exists(component_file):
@@ -106,7 +140,8 @@ def extract_connected_components(input_file, output_folder,component_size):
                         continue # skip component
 
 
-                itk.imwrite(component_image.GetOutput(), component_file)  # Write component to file
+                # Write component to file; compression is cheap for binary masks and cuts disk I/O
+                sitk.WriteImage(component_image, component_file, useCompression=True)
                 components.append(component_file)
                 # User feedback: Log information about saved components
                 logger.info(f"Component {component_id} saved as {os.path.basename(component_file)}" )
@@ -122,14 +157,15 @@ def extract_connected_components(input_file, output_folder,component_size):
 
     # We handle the case where user decides not to overwrite any component and no further components to process exist
     if len(components) >= 1:
-        for component in components:
-            print(component)
+        # One buffered write for all component paths instead of a syscall per line
+        sys.stdout.write('\n'.join(components) + '\n')
+        sys.stdout.flush()
     else:
         logger.info("No components to proceed with after segmentation. System will terminate")
         sys.exit(0)
 
-# Read input file path from stdin
-input_file = sys.stdin.read().strip()
+# Read input file path from stdin in one buffered read
+input_file = sys.stdin.buffer.read().decode('utf-8').strip()
 
 # Read filtering parameters and desired output folder from the command-line arguments
 output_folder = sys.argv[1]